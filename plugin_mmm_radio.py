@@ -4,6 +4,7 @@
 import mpv
 import os
 import time
+import threading
 from pixel_ring import pixel_ring
 from gpiozero import LED
 from vacore import VACore
@@ -14,11 +15,72 @@ modname = os.path.basename(__file__)[:-3] # calculating modname
 
 TimerSleep = False
 
+# параметры mpv, которые можно задать в профиле запуска станции
+STARTUP_PROFILE_PROPERTIES = {
+    # влияют на время до первого звука
+    "probeSize": "demuxer-lavf-probesize",             # сколько байт читать для определения формата
+    "analyzeDuration": "demuxer-lavf-analyzeduration", # сколько секунд потока анализировать перед стартом
+    "cachePauseInitial": "cache-pause-initial",        # ждать заполнения кеша перед стартом (yes/no)
+    "networkTimeout": "network-timeout",               # таймаут сети в секундах
+    # защищают от прерываний звука на тяжелых потоках
+    "cacheSecs": "cache-secs",                         # максимальный запас кеша в секундах
+    "readaheadSecs": "demuxer-readahead-secs",         # на сколько секунд вперед читать поток
+    "cachePauseWait": "cache-pause-wait",              # сколько секунд набирать кеш после опустошения
+}
+STARTUP_STATS_SIZE = 20 # сколько последних запусков помнить для каждой станции
+
+mpvDefaults = {}        # исходные значения параметров профиля, чтобы сбрасывать их между станциями
+startupTimes = {}       # станция -> время от запуска до первого звука, в секундах
+startupPending = None   # (станция, время запуска) - запуск, для которого еще нет звука
+
+class CommandTask:
+    """Выполнение долгой команды в отдельном потоке с возможностью прервать её.
+
+    Новая команда плагина прерывает выполняющуюся. Команда получает
+    последним аргументом cancel (threading.Event), проверяет его между
+    шагами и ждет через cancel.wait() вместо time.sleep().
+    """
+
+    def __init__(self, join_timeout: float = 2.0):
+        self.join_timeout = join_timeout
+        self._lock = threading.Lock()
+        self._cancel = None
+        self._thread = None
+
+    def run(self, func, *args):
+        """Прерывает текущую команду и запускает func(*args, cancel) в фоне"""
+        with self._lock:
+            self._cancel_current()
+            cancel = threading.Event()
+            self._cancel = cancel
+            self._thread = threading.Thread(target=self._run, args=(func, args, cancel), daemon=True)
+            self._thread.start()
+
+    def cancel(self):
+        """Прерывает текущую команду"""
+        with self._lock:
+            self._cancel_current()
+
+    def _run(self, func, args, cancel):
+        try:
+            func(*args, cancel)
+        except Exception as e:
+            print(f"Ошибка выполнения команды: {e}")
+
+    def _cancel_current(self):
+        if self._cancel is not None:
+            self._cancel.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(self.join_timeout)
+
+radio_task = CommandTask() # плавное включение и выключение радио
+
 # функция на старте
 def start(core:VACore):
     manifest = { # возвращаем настройки плагина - словарь
         "name": "MMM_Radio", # имя
-        "version": "1.2", # версия
+        "version": "1.4", # версия
         "require_online": True, # требует ли онлайн?
         "default_options": {
             "radioStations": [
@@ -35,6 +97,11 @@ def start(core:VACore):
             "TimeSleep": 1800,  # по команде "Спать": через сколько секунд выключить радио.
             "TimesToReduce": 2, # по команде "Спать": во сколько раз уменьшить громкость, 1 - не уменьшать. 
             "is_need_light" : False, # Нужно ли мигание лампочек (при использовании respeaker в качестве микрофона)
+            "startupProfiles": { # параметры буферизации при запуске: "default" для всех станций,
+                                 # остальные - для станций, в адресе которых есть ключ
+                "default": {"probeSize": 32768, "analyzeDuration": 0.5, "networkTimeout": 10},
+                "europaplus256": {"readaheadSecs": 5, "cachePauseWait": 2},
+            },
         },
 
         "commands": { # набор скиллов. Фразы скилла разделены | . Если найдены - вызывается функция
@@ -49,6 +116,7 @@ def start(core:VACore):
             "радио сильно тише": (RadioVolumeChange, -35),
             "радио сильно громче": (RadioVolumeChange, 35),
             "потом выключи|спать": (RadioTimerSleep),
+            "радио задержка|скорость запуска радио": RadioStartupReport,
          }
     }
     return manifest
@@ -60,6 +128,13 @@ def start_with_options(core:VACore, manifest:dict):
 def RadioPlay(core:VACore, phrase: str): # в phrase находится остаток фразы после названия скилла,
                                               # если юзер сказал больше
                                               # в этом плагине не используется
+    # включаем в фоне, чтобы плавное увеличение громкости можно было прервать
+    radio_task.run(RadioPlayTask, core, phrase)
+
+    # ----------- set context ------
+    core.context_set(RadioContext)
+
+def RadioPlayTask(core:VACore, phrase: str, cancel: threading.Event):
     options = core.plugin_options(modname)
     global player
     core.play_voice_assistant_speech("включаю")
@@ -81,18 +156,19 @@ def RadioPlay(core:VACore, phrase: str): # в phrase находится оста
     if "шоколад" in phrase:
         options["radioPlay"] = next((i for i, item in enumerate(options["radioStations"]) if "choco" in item), None)
     core.save_plugin_options(modname,options)
-    player.play(options["radioStations"][options["radioPlay"]])
+    if cancel.is_set():
+        return
+    RadioPlayStation(core, options["radioStations"][options["radioPlay"]])
     while player.volume <= options["radioVolume"]:
         player.volume +=1
-        time.sleep(0.1)
-
-    # ----------- set context ------
-    core.context_set(RadioContext)
+        if cancel.wait(0.1):
+            break
  
 def RadioChange(core:VACore, phrase: str): # в phrase находится остаток фразы после названия скилла,
                                               # если юзер сказал больше
                                               # в этом плагине не используется
     global player
+    radio_task.cancel()
     if not player.filename:
         core.play_voice_assistant_speech("радио не включено")
         return
@@ -100,12 +176,76 @@ def RadioChange(core:VACore, phrase: str): # в phrase находится ост
     player.stop()
     options["radioPlay"] = (options["radioPlay"] + 1) % len(options["radioStations"])
     core.save_plugin_options(modname,options)
-    player.play(options["radioStations"][options["radioPlay"]])
+    RadioPlayStation(core, options["radioStations"][options["radioPlay"]])
     if options["is_need_light"]:
         think_light(core)
     # ----------- set context ------
     core.context_set(RadioContext)
 
+def RadioPlayStation(core:VACore, url: str):
+    # применяет профиль запуска станции и запускает её, засекая время до первого звука
+    global player
+    global startupPending
+    options = core.plugin_options(modname)
+    profiles = options.get("startupProfiles", {})
+    profile = dict(profiles.get("default", {}))
+    for name, stationProfile in profiles.items():
+        if name != "default" and name in url:
+            profile.update(stationProfile)
+            break
+
+    # запоминаем значения mpv по умолчанию до первого изменения
+    if not mpvDefaults:
+        for prop in STARTUP_PROFILE_PROPERTIES.values():
+            try:
+                mpvDefaults[prop] = player[prop]
+            except Exception as e:
+                print(f"MMM_Radio: не удалось прочитать {prop}: {e}")
+
+    for name in profile:
+        if name not in STARTUP_PROFILE_PROPERTIES:
+            print(f"MMM_Radio: неизвестный параметр профиля запуска {name}")
+
+    # параметры, которых нет в профиле, возвращаем к значениям по умолчанию,
+    # чтобы настройки прошлой станции не переходили на следующую
+    for name, prop in STARTUP_PROFILE_PROPERTIES.items():
+        value = profile.get(name, mpvDefaults.get(prop))
+        if value is None:
+            continue
+        try:
+            player[prop] = value
+        except Exception as e:
+            print(f"MMM_Radio: не удалось установить {prop}={value}: {e}")
+
+    startupPending = (url, time.monotonic())
+    player.play(url)
+
+@player.event_callback('playback-restart')
+def RadioPlaybackStarted(event):
+    # mpv начал воспроизведение после загрузки потока - считаем время до первого звука
+    global startupPending
+    pending = startupPending
+    if pending is None:
+        return
+    startupPending = None
+    url, started = pending
+    elapsed = time.monotonic() - started
+    times = startupTimes.setdefault(url, [])
+    times.append(elapsed)
+    del times[:-STARTUP_STATS_SIZE]
+    print(f"MMM_Radio: {url} - звук через {elapsed:.2f} с (в среднем {sum(times) / len(times):.2f} с за {len(times)} запусков)")
+
+def RadioStartupReport(core:VACore, phrase: str):
+    options = core.plugin_options(modname)
+    url = options["radioStations"][options["radioPlay"]]
+    times = startupTimes.get(url)
+    if not times:
+        core.play_voice_assistant_speech("эта станция еще не запускалась")
+        return
+    last = f"{times[-1]:.1f}".replace(".", ",")
+    average = f"{sum(times) / len(times):.1f}".replace(".", ",")
+    core.play_voice_assistant_speech(f"последний запуск за {last} секунды, в среднем за {average}")
+
 def RadioContext(core:VACore, phrase: str): # в phrase находится остаток фразы после названия скилла,
                                               # если юзер сказал больше
                                               # в этом плагине не используется
@@ -140,13 +280,24 @@ def RadioContext(core:VACore, phrase: str): # в phrase находится ос
     core.context_set(RadioContext)
 
 def RadioStop(core:VACore, phrase: str): # в phrase находится остаток фразы после названия скилла,
+    global TimerSleep
+    radio_task.cancel()
+    TimerSleep = False # по команде выключаем сразу, даже если идет плавное выключение по таймеру
+    RadioStopTask(core, phrase, threading.Event())
+
+def RadioSleepStop(core:VACore, phrase: str):
+    # по таймеру выключаем плавно, в фоне
+    radio_task.run(RadioStopTask, core, phrase)
+
+def RadioStopTask(core:VACore, phrase: str, cancel: threading.Event):
     global player
     global TimerSleep
     
     if TimerSleep:
         while player.volume > 1:
             player.volume -=1
-            time.sleep(0.1)
+            if cancel.wait(0.1):
+                return # выключение прервано другой командой
 
     if player.filename:
         player.stop()
@@ -163,6 +314,7 @@ def RadioStop(core:VACore, phrase: str): # в phrase находится оста
         
 def RadioPause(core:VACore, phrase: str):
     global player
+    radio_task.cancel()
     player.pause = not player.pause
     options = core.plugin_options(modname)
     if options["is_need_light"]:
@@ -172,6 +324,7 @@ def RadioPause(core:VACore, phrase: str):
     
 def RadioVolumeChange(core:VACore, phrase: str, level:int):
     global player
+    radio_task.cancel()
     global lastRadioVolumeChange
     lastRadioVolumeChange = level
     new_volume = player.volume + level
@@ -194,12 +347,13 @@ def RadioVolumeChange(core:VACore, phrase: str, level:int):
     
 def RadioTimerSleep(core:VACore, phrase: str):
     global player
+    radio_task.cancel()
     global TimerSleep
     options = core.plugin_options(modname)
     TimerSleep = True
     player.volume = player.volume//options["TimesToReduce"]
     core.play_voice_assistant_speech("выключу радио попозже")
-    core.set_timer(options["TimeSleep"],(RadioStop, phrase))
+    core.set_timer(options["TimeSleep"],(RadioSleepStop, phrase))
 
 def init_light(core: VACore):
     core.power = LED(6)
@@ -1,9 +1,17 @@
 # Плагин управления музыкой через VLC player
 # author: protos17
 # необходимо установить: pip install python-vlc
+# для выравнивания громкости треков: pip install numpy и ffmpeg в системе
 
 import os
+import json
+import math
+import queue
+import atexit
 import random
+import subprocess
+import threading
+import multiprocessing
 import vlc
 import time
 from pixel_ring import pixel_ring
@@ -11,11 +19,247 @@ from gpiozero import LED
 from pathlib import Path
 from vacore import VACore
 from urllib.parse import unquote
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 modname = os.path.basename(__file__)[:-3]
 
+SUPPORTED_FORMATS = {'.mp3', '.wav', '.ogg', '.flac', '.m4a', '.wma'}
+SCAN_WORKERS = 4               # сколько папок сканировать параллельно
+SCAN_FIRST_RESULT_TIMEOUT = 3  # сколько секунд play() ждет первых найденных файлов
+
+LOUDNESS_FILE = ".loudness.json"  # поправки громкости треков, хранятся в папке с музыкой
+ANALYSIS_SAMPLE_RATE = 22050
+ANALYSIS_BLOCK_SECONDS = 0.4  # блоки по 400 мс, как в ITU-R BS.1770
+ANALYSIS_CHUNK_BLOCKS = 256   # сколько блоков читать из ffmpeg за раз
+ANALYSIS_SAVE_EVERY = 50      # как часто сохранять результаты анализа
+MAX_VLC_VOLUME = 200          # VLC умеет усиливать до 200%, это запас для тихих треков
+
+WORKER_RESTART_DELAY = 1          # пауза перед первым перезапуском упавшего при запуске процесса, удваивается
+WORKER_MAX_STARTUP_FAILURES = 5   # после стольких падений подряд при запуске процесс больше не перезапускается
+
+def analyze_track_loudness(path: str) -> tuple:
+    """Считает интегральную громкость (LUFS) и пиковый уровень трека.
+
+    Трек декодируется ffmpeg в моно float32 и обрабатывается блоками,
+    с гейтированием по BS.1770 (без K-фильтра). Возвращает (None, None)
+    для тишины или пустого файла.
+    """
+    import numpy as np
+
+    block_size = int(ANALYSIS_SAMPLE_RATE * ANALYSIS_BLOCK_SECONDS)
+    chunk_bytes = block_size * ANALYSIS_CHUNK_BLOCKS * 4
+    process = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-v", "quiet", "-i", path,
+         "-f", "f32le", "-ac", "1", "-ar", str(ANALYSIS_SAMPLE_RATE), "-"],
+        stdout=subprocess.PIPE
+    )
+
+    powers = []
+    peak = 0.0
+    tail = np.empty(0, dtype=np.float32)
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            samples = np.concatenate((tail, np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)))
+            count = samples.size // block_size
+            tail = samples[count * block_size:]
+            if count:
+                blocks = samples[:count * block_size].reshape(count, block_size)
+                powers.append(np.mean(np.square(blocks, dtype=np.float64), axis=1))
+                peak = max(peak, float(np.max(np.abs(blocks))))
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    if tail.size:
+        powers.append(np.array([np.mean(np.square(tail, dtype=np.float64))]))
+        peak = max(peak, float(np.max(np.abs(tail))))
+    if not powers:
+        return None, None
+
+    power = np.concatenate(powers)
+    power = power[power > 0]
+    # Абсолютный порог -70 LUFS, затем относительный на 10 LU ниже среднего
+    power = power[-0.691 + 10 * np.log10(power) > -70]
+    if not power.size:
+        return None, None
+    relative_gate = -0.691 + 10 * math.log10(power.mean()) - 10
+    power = power[-0.691 + 10 * np.log10(power) > relative_gate]
+    return -0.691 + 10 * math.log10(power.mean()), peak
+
+def scan_music_folder(root: str, on_files, workers: int = SCAN_WORKERS, is_cancelled=None):
+    """Обходит папку с музыкой и все подпапки, сканируя их параллельно.
+
+    Найденные файлы передаются в on_files(list) по мере обхода, по одной
+    папке за раз, поэтому первые треки доступны до окончания сканирования.
+    """
+    def scan_dir(path: str) -> tuple:
+        files, dirs = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        # Тип берется из результата scandir, без отдельного stat на файл
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_FORMATS and entry.is_file():
+                            files.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Не удалось прочитать папку {path}: {e}")
+        files.sort()
+        return files, dirs
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {pool.submit(scan_dir, root)}
+        while running:
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                files, dirs = future.result()
+                if is_cancelled and is_cancelled():
+                    return
+                if files:
+                    on_files(files)
+                running.update(pool.submit(scan_dir, path) for path in dirs)
+
+class LoudnessLibrary:
+    """Громкость треков из папки с музыкой для выравнивания при воспроизведении.
+
+    Результаты анализа хранятся в LOUDNESS_FILE вместе с размером и временем
+    изменения файла, поэтому при следующем запуске анализируются только
+    новые и измененные треки, а прерванный анализ продолжается с того же места.
+    """
+
+    def __init__(self, music_folder: Path, target_loudness: float = -18.0, workers: int = 2):
+        self.music_folder = music_folder
+        self.path = music_folder / LOUDNESS_FILE
+        self.target_loudness = target_loudness
+        self.workers = max(workers, 1)
+        self.tracks: dict = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.tracks = json.load(f)
+        except FileNotFoundError:
+            self.tracks = {}
+        except (OSError, ValueError) as e:
+            print(f"Не удалось прочитать {self.path}: {e}")
+            self.tracks = {}
+
+    def _save(self):
+        with self._lock:
+            data = json.dumps(self.tracks, ensure_ascii=False)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Не удалось сохранить {self.path}: {e}")
+
+    def _key(self, track: str) -> str:
+        try:
+            return str(Path(track).relative_to(self.music_folder))
+        except ValueError:
+            return track
+
+    def _signature(self, track: str):
+        try:
+            stat = os.stat(track)
+        except OSError:
+            return None
+        return [stat.st_size, int(stat.st_mtime)]
+
+    def gain(self, track: str) -> float:
+        """Поправка громкости трека в дБ, 0 если трек еще не проанализирован"""
+        with self._lock:
+            entry = self.tracks.get(self._key(track))
+        if not entry or entry.get("loudness") is None:
+            return 0.0
+        gain = self.target_loudness - entry["loudness"]
+        # Не поднимаем громкость выше, чем позволяет пик трека
+        if entry.get("peak"):
+            gain = min(gain, -20 * math.log10(entry["peak"]))
+        return gain
+
+    def start(self, tracks: list):
+        """Запускает фоновый анализ треков, которых еще нет в библиотеке"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._analyze, args=(list(tracks),), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _analyze(self, tracks: list):
+        try:
+            import numpy
+        except ImportError:
+            print("Для выравнивания громкости нужно установить numpy: pip install numpy")
+            return
+
+        pending = []
+        for track in tracks:
+            signature = self._signature(track)
+            entry = self.tracks.get(self._key(track))
+            if signature and (not entry or entry.get("signature") != signature):
+                pending.append((track, signature))
+        if not pending:
+            return
+        print(f"Анализ громкости: {len(pending)} треков")
+
+        done = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            queue = iter(pending)
+            running = {}
+            while True:
+                # Держим в пуле немного задач, чтобы остановка не ждала всю библиотеку
+                while len(running) < self.workers * 2 and not self._stop.is_set():
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    running[pool.submit(analyze_track_loudness, item[0])] = item
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    track, signature = running.pop(future)
+                    try:
+                        loudness, peak = future.result()
+                    except FileNotFoundError:
+                        print("Для выравнивания громкости нужен ffmpeg")
+                        self._stop.set()
+                        continue
+                    except Exception as e:
+                        print(f"Ошибка анализа громкости {track}: {e}")
+                        loudness, peak = None, None
+                    with self._lock:
+                        self.tracks[self._key(track)] = {
+                            "signature": signature,
+                            "loudness": loudness,
+                            "peak": peak,
+                        }
+                    done += 1
+                    if done % ANALYSIS_SAVE_EVERY == 0:
+                        self._save()
+
+        self._save()
+        print(f"Анализ громкости завершен: {done} треков")
+
 class MusicPlayer:
-    def __init__(self, music_folder: str = "../Music"):
+    def __init__(self, music_folder: str = "../Music", normalize_loudness: bool = False,
+                 target_loudness: float = -18.0, analysis_workers: int = 2):
         # Получаем абсолютный путь к папке с музыкой
         base_dir = Path(os.getcwd())
         self.music_folder = (base_dir / music_folder).resolve()
@@ -24,6 +268,14 @@ class MusicPlayer:
         self.list_player = self.instance.media_list_player_new()
         self.player = self.instance.media_player_new()
         self.playlist: list = []
+        self.media_list = None  # список VLC, в который дописываются треки во время сканирования
+        self._live_tracks: list = []  # пути треков в media_list, в том же порядке
+        self._library: list = []  # все найденные треки; после сканирования - в обычном порядке
+        self._playlist_lock = threading.Lock()
+        self._control_lock = threading.Lock()  # play() и stop() из разных потоков выполняются по очереди
+        self._volume_lock = threading.Lock()
+        self._scan_generation: int = 0
+        self._scan_ready = threading.Event()  # найдены первые треки или сканирование завершено
         self.current_track_index: int = -1
         self.is_playing: bool = False
         self.volume: int = 50
@@ -35,17 +287,112 @@ class MusicPlayer:
         # Создаем папку для музыки если её нет
         self.music_folder.mkdir(exist_ok=True, parents=True)
         
+        self.loudness = None
+        if normalize_loudness:
+            self.loudness = LoudnessLibrary(self.music_folder, target_loudness, analysis_workers)
+            # Поправку громкости применяем при каждой смене трека. Вызывать libvlc
+            # из обработчика событий нельзя, поэтому громкость меняет отдельный поток
+            self._volume_requests = queue.Queue()
+            threading.Thread(target=self._volume_worker, daemon=True).start()
+            self.player.event_manager().event_attach(
+                vlc.EventType.MediaPlayerMediaChanged, self._on_media_changed
+            )
+        
         self._load_playlist()
     
     def _load_playlist(self):
-        """Загружает список музыкальных файлов из папки"""
-        supported_formats = {'.mp3', '.wav', '.ogg', '.flac', '.m4a', '.wma'}
-        self.playlist = []
+        """Запускает фоновую загрузку списка музыкальных файлов из папки и подпапок"""
+        with self._playlist_lock:
+            self._scan_generation += 1
+            generation = self._scan_generation
+            self.playlist = []
+            self._library = []
+            self.media_list = None
+            self._live_tracks = []
+            self._scan_ready.clear()
+        
+        threading.Thread(target=self._scan_playlist, args=(generation,), daemon=True).start()
+    
+    def _scan_playlist(self, generation: int):
+        """Сканирует папку, дописывая найденные треки в плейлист и в играющий список VLC"""
+        def is_cancelled() -> bool:
+            return generation != self._scan_generation
+        
+        def add_files(files: list):
+            with self._playlist_lock:
+                if is_cancelled():
+                    return
+                self._library.extend(files)
+                if self.is_shuffled:
+                    # В перемешанный плейлист новые треки попадают в случайные места
+                    for file in files:
+                        self.playlist.insert(random.randint(0, len(self.playlist)), file)
+                else:
+                    self.playlist.extend(files)
+                if self.media_list is not None:
+                    self.media_list.lock()
+                    try:
+                        self._add_live_tracks(files)
+                    finally:
+                        self.media_list.unlock()
+            self._scan_ready.set()
         
-        if self.music_folder.exists() and self.music_folder.is_dir():
-            for file in self.music_folder.iterdir():
-                if file.suffix.lower() in supported_formats and file.is_file():
-                    self.playlist.append(str(file.absolute()))
+        if self.music_folder.is_dir():
+            scan_music_folder(str(self.music_folder), add_files, is_cancelled=is_cancelled)
+        
+        with self._playlist_lock:
+            if is_cancelled():
+                return
+            # Папки приходят в порядке завершения потоков, поэтому после
+            # сканирования восстанавливаем постоянный порядок
+            self._library.sort()
+            if not self.is_shuffled:
+                self.playlist = list(self._library)
+                if self.media_list is not None:
+                    self.media_list.lock()
+                    try:
+                        self._reorder_live_tracks(self._library)
+                    finally:
+                        self.media_list.unlock()
+            self._scan_ready.set()
+            tracks = list(self._library)
+        if self.loudness:
+            self.loudness.start(tracks)
+    
+    def _current_live_index(self) -> int:
+        """Номер играющего трека в media_list, -1 если ничего не играет"""
+        media = self.player.get_media()
+        if media is None:
+            return -1
+        return self.media_list.index_of_item(media)
+    
+    def _add_live_tracks(self, files: list):
+        """Дописывает найденные треки в играющий список VLC (media_list должен быть заблокирован)"""
+        if not self.is_shuffled:
+            for file in files:
+                self.media_list.add_media(self.instance.media_new(file))
+            self._live_tracks.extend(files)
+            return
+        # Перемешанные треки вставляем в случайные места после текущего
+        current = self._current_live_index()
+        for file in files:
+            position = random.randint(current + 1, len(self._live_tracks))
+            self.media_list.insert_media(self.instance.media_new(file), position)
+            self._live_tracks.insert(position, file)
+    
+    def _reorder_live_tracks(self, ordered: list):
+        """Переставляет еще не сыгранные треки играющего списка VLC в порядке ordered
+        (media_list должен быть заблокирован)"""
+        current = self._current_live_index()
+        played = set(self._live_tracks[:current + 1])
+        upcoming = [track for track in ordered if track not in played]
+        if upcoming == self._live_tracks[current + 1:]:
+            return
+        for index in range(len(self._live_tracks) - 1, current, -1):
+            self.media_list.remove_index(index)
+        for track in upcoming:
+            self.media_list.add_media(self.instance.media_new(track))
+        self._live_tracks = self._live_tracks[:current + 1] + upcoming
     
     def latin_to_cyrillic(self, text: str) -> str:
         """Преобразует латинские символы в кириллические для озвучивания"""
@@ -117,8 +464,10 @@ class MusicPlayer:
         
         return name
     
-    def play(self, track_index: int = None) -> bool:
-        """Воспроизведение трека"""
+    def play(self, track_index: int = None, cancel: threading.Event = None) -> bool:
+        """Воспроизведение трека; cancel позволяет отменить запуск до начала воспроизведения"""
+        # Для начала воспроизведения достаточно первых найденных файлов
+        self._scan_ready.wait(SCAN_FIRST_RESULT_TIMEOUT)
         if not self.playlist:
             return False
         
@@ -132,12 +481,18 @@ class MusicPlayer:
                 return False
         
         try:
-            self.list_player.stop()
-            media = self.instance.media_list_new(self.playlist)
-            self.list_player.set_media_list(media)
-            self.list_player.play()
-            self.current_track_index = track_index
-            self.is_playing = True
+            with self._control_lock:
+                # Проверяем под блокировкой: stop() после отмены выполнится уже после нас
+                if cancel is not None and cancel.is_set():
+                    return False
+                self.list_player.stop()
+                with self._playlist_lock:
+                    self.media_list = self.instance.media_list_new(self.playlist)
+                    self._live_tracks = list(self.playlist)
+                    self.list_player.set_media_list(self.media_list)
+                self.list_player.play()
+                self.current_track_index = track_index
+                self.is_playing = True
             return True
         except Exception as e:
             print(f"Ошибка воспроизведения: {e}")
@@ -153,19 +508,23 @@ class MusicPlayer:
     
     def stop(self) -> bool:
         """Остановка воспроизведения"""
-        self.list_player.stop()
-        self.is_playing = False
+        with self._control_lock:
+            self.list_player.stop()
+            self.is_playing = False
         return True
     
     def shuffle_playlist(self):
         """Перемешивает плейлист"""
-        random.shuffle(self.playlist)
-        self.is_shuffled = True
+        with self._playlist_lock:
+            random.shuffle(self.playlist)
+            self.is_shuffled = True
     
     def unshuffle_playlist(self):
         """Возвращает оригинальный порядок плейлиста"""
-        self._load_playlist()
-        self.is_shuffled = False
+        with self._playlist_lock:
+            # Если сканирование еще идет, порядок окончательно восстановится по его завершении
+            self.playlist = sorted(self._library)
+            self.is_shuffled = False
 
     def next_track(self):
         """Следующий трек"""
@@ -179,10 +538,36 @@ class MusicPlayer:
         """Установка громкости (0-100)"""
         if 0 <= volume <= 100:
             self.volume = volume
-            self.player.audio_set_volume(volume)
+            self._apply_volume()
             return True
         return False
     
+    def _apply_volume(self):
+        """Передает в VLC громкость с поправкой на громкость текущего трека"""
+        with self._volume_lock:
+            volume = self.volume
+            if self.loudness:
+                track = self._current_track_path()
+                if track:
+                    volume = round(volume * 10 ** (self.loudness.gain(track) / 20))
+            self.player.audio_set_volume(min(max(volume, 0), MAX_VLC_VOLUME))
+    
+    def _on_media_changed(self, event):
+        # Вызывается из потока libvlc: только передаем запрос дальше
+        self._volume_requests.put(None)
+    
+    def _volume_worker(self):
+        """Применяет поправку громкости после смены трека"""
+        while True:
+            self._volume_requests.get()
+            # Несколько смен трека подряд достаточно обработать один раз
+            while not self._volume_requests.empty():
+                self._volume_requests.get_nowait()
+            try:
+                self._apply_volume()
+            except Exception as e:
+                print(f"Ошибка установки громкости: {e}")
+    
     def volume_up(self, step: int = 10) -> bool:
         """Увеличить громкость"""
         new_volume = min(100, self.volume + step)
@@ -193,6 +578,13 @@ class MusicPlayer:
         new_volume = max(0, self.volume - step)
         return self.set_volume(new_volume)
     
+    def _current_track_path(self) -> str:
+        """Путь к файлу текущего трека"""
+        media = self.player.get_media()
+        if not media:
+            return ""
+        return unquote(media.get_mrl().replace('file://', ''))
+    
     def get_current_track(self) -> str:
         """Получить название текущего трека"""
         mrl = self.player.get_media().get_mrl()
@@ -232,24 +624,393 @@ class MusicPlayer:
         pixel_ring.off()
         self.power.off()
 
+def _music_worker(conn, music_folder: str, player_options: dict):
+    """Цикл отдельного процесса, в котором живет MusicPlayer и все вызовы libvlc"""
+    player = MusicPlayer(music_folder, **player_options)
+    conn.send((0, True, None, _player_state(player)))  # сигнал готовности
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+
+        request_id, method, args = request
+        try:
+            result = getattr(player, method)(*args)
+            ok = True
+        except Exception as e:
+            print(f"Ошибка в процессе плеера ({method}): {e}")
+            result = None
+            ok = False
+
+        try:
+            conn.send((request_id, ok, result, _player_state(player)))
+        except (EOFError, OSError):
+            break
+
+    if player.loudness:
+        player.loudness.stop()
+    player.stop()
+
+def _player_state(player: MusicPlayer) -> dict:
+    """Состояние плеера, которое команды читают напрямую.
+
+    Громкость сюда не входит: её хранит сам MusicPlayerProxy.
+    """
+    return {
+        "is_playing": player.is_playing,
+        "is_shuffled": player.is_shuffled,
+    }
+
+class MusicPlayerProxy:
+    """Клиент к MusicPlayer, запущенному в отдельном процессе.
+
+    Команды, результат которых не нужен (стоп, громкость, переключение
+    треков, лампочки), отправляются через pipe без ожидания ответа.
+    Остальные ждут ответа не дольше timeout и при задержке возвращают
+    значение по умолчанию. Ответы читает отдельный поток: он же следит,
+    чтобы процесс отвечал, и перезапускает его, если процесс упал или
+    не отвечает дольше startup_timeout при запуске и hang_timeout потом.
+    Если процесс падает, не успев запуститься, перезапуски идут всё реже,
+    а после WORKER_MAX_STARTUP_FAILURES неудач подряд прекращаются.
+    """
+
+    def __init__(self, music_folder: str = "../Music", timeout: float = 5.0, startup_timeout: float = 30.0,
+                 hang_timeout: float = 30.0, player_options: dict = None):
+        self.music_folder = music_folder
+        self.player_options = player_options or {}
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.hang_timeout = hang_timeout
+        self.volume: int = 50
+        self.is_playing: bool = False
+        self.is_shuffled: bool = False
+        self._lock = threading.Lock()  # отправка сообщений и замена процесса
+        self._request_id: int = 0
+        self._pending: dict = {}  # id -> [время отправки, Event или None, (ok, результат)]
+        self._process = None
+        self._conn = None
+        self._ready = threading.Event()
+        self._spawned_at: float = 0
+        self._ready_at: float = 0
+        self._closed: bool = False
+        self._startup_failures: int = 0
+        self._failed: bool = False  # процесс так и не запустился, команды не отправляем
+        self._spawn()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+        atexit.register(self.shutdown)
+
+    def _spawn(self):
+        """Запускает процесс плеера"""
+        parent_conn, child_conn = multiprocessing.Pipe()
+        # Не daemon: процессу плеера нужен свой пул процессов для анализа громкости,
+        # остановка при выходе делается в shutdown()
+        self._process = multiprocessing.Process(
+            target=_music_worker, args=(child_conn, self.music_folder, self.player_options)
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._ready.clear()
+        self._spawned_at = time.monotonic()
+
+    def _respawn(self, reason: str):
+        """Убивает процесс и запускает новый с прежней громкостью"""
+        if self._ready.is_set():
+            self._startup_failures = 0
+        else:
+            self._startup_failures += 1
+
+        with self._lock:
+            self._kill()
+            self.is_playing = False
+            failed = self._pending
+            self._pending = {}
+            if self._startup_failures >= WORKER_MAX_STARTUP_FAILURES:
+                self._failed = True
+        # Ожидающие ответа команды получат значение по умолчанию
+        for entry in failed.values():
+            if entry[1] is not None:
+                entry[1].set()
+
+        if self._failed:
+            print(f"Процесс музыкального плеера {reason}, "
+                  f"не удалось запустить его {self._startup_failures} раз подряд, больше не перезапускаю")
+            return
+        delay = WORKER_RESTART_DELAY * 2 ** (self._startup_failures - 1) if self._startup_failures else 0
+        print(f"Процесс музыкального плеера {reason}, перезапускаю" + (f" через {delay} с" if delay else ""))
+        time.sleep(delay)
+
+        with self._lock:
+            if self._closed:
+                return
+            self._spawn()
+            # Сообщения копятся в pipe, пока процесс запускается;
+            # если он уже упал, это заметит следующая итерация _read_loop
+            try:
+                self._send_locked("set_volume", (self.volume,), None)
+            except (OSError, ValueError):
+                pass
+
+    def _kill(self):
+        try:
+            self._conn.close()
+        except OSError:
+            pass
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join(1)
+
+    def _send_locked(self, method: str, args: tuple, waiter, cancel: threading.Event = None):
+        """Отправляет вызов в процесс плеера (вызывать под self._lock).
+
+        Если cancel уже установлен, ничего не отправляет и возвращает None.
+        """
+        if cancel is not None and cancel.is_set():
+            return None
+        self._request_id += 1
+        self._pending[self._request_id] = [time.monotonic(), waiter, None]
+        self._conn.send((self._request_id, method, args))
+        return self._pending[self._request_id]
+
+    def _send(self, method: str, *args):
+        """Отправляет вызов без ожидания ответа"""
+        if self._failed:
+            return
+        with self._lock:
+            try:
+                self._send_locked(method, args, None)
+            except (OSError, ValueError) as e:
+                print(f"Ошибка связи с процессом плеера ({method}): {e}")
+
+    def _call(self, method: str, *args, default=None, cancel: threading.Event = None):
+        """Вызывает метод MusicPlayer и ждет результат не дольше timeout"""
+        if self._failed:
+            return default
+        waiter = threading.Event()
+        with self._lock:
+            try:
+                entry = self._send_locked(method, args, waiter, cancel)
+            except (OSError, ValueError) as e:
+                print(f"Ошибка связи с процессом плеера ({method}): {e}")
+                return default
+        if entry is None:
+            return default
+
+        # Пока процесс запускается, ответа ждем дольше; команды с ответом
+        # (play) выполняются в фоновой задаче и поток команд не блокируют
+        if not self._ready.is_set():
+            self._ready.wait(self.startup_timeout)
+        if not waiter.wait(self.timeout):
+            # Процесс не убиваем: медленный ответ еще не зависание
+            print(f"Процесс плеера не ответил за {self.timeout} с ({method})")
+            entry[1] = None
+            return default
+        if entry[2] is None:
+            return default
+        ok, result = entry[2]
+        return result if ok else default
+
+    def _read_loop(self):
+        """Читает ответы процесса плеера и следит, что он жив и отвечает"""
+        while not self._closed and not self._failed:
+            conn = self._conn
+            try:
+                message = conn.recv() if conn.poll(0.5) else None
+            except (EOFError, OSError):
+                # Процесс закрыл pipe; перезапуск ниже, вне обработчика исключения
+                message = None
+                if conn is not self._conn:
+                    continue
+                time.sleep(0.1)
+
+            if self._closed:
+                break
+            if message is not None:
+                self._handle(message)
+                continue
+
+            if not self._process.is_alive():
+                self._respawn("завершился")
+                continue
+            with self._lock:
+                oldest = min((entry[0] for entry in self._pending.values()), default=None)
+            if oldest is None:
+                continue
+            if self._ready.is_set():
+                waited = time.monotonic() - max(oldest, self._ready_at)
+                limit = self.hang_timeout
+            else:
+                waited = time.monotonic() - self._spawned_at
+                limit = self.startup_timeout
+            if waited > limit:
+                self._respawn(f"не отвечает {waited:.0f} с")
+
+    def _handle(self, message):
+        request_id, ok, result, state = message
+        if request_id == 0:
+            self._ready_at = time.monotonic()
+            self._ready.set()
+        for name, value in state.items():
+            setattr(self, name, value)
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is not None and entry[1] is not None:
+            entry[2] = (ok, result)
+            entry[1].set()
+
+    def shutdown(self):
+        """Останавливает процесс плеера"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self._process.join(self.timeout)
+            self._kill()
+
+    def play(self, track_index: int = None, cancel: threading.Event = None) -> bool:
+        # Событие отмены в другой процесс не передать, поэтому его проверяет _send_locked
+        # под self._lock: stop(), отправленный позже, выполнится после play()
+        return self._call("play", track_index, default=False, cancel=cancel)
+
+    def pause(self) -> bool:
+        return self._call("pause", default=False)
+
+    def stop(self) -> bool:
+        self.is_playing = False
+        self._send("stop")
+        return True
+
+    def shuffle_playlist(self):
+        self.is_shuffled = True
+        self._send("shuffle_playlist")
+
+    def unshuffle_playlist(self):
+        self.is_shuffled = False
+        self._send("unshuffle_playlist")
+
+    def next_track(self):
+        self._send("next_track")
+
+    def previous_track(self):
+        self._send("previous_track")
+
+    def set_volume(self, volume: int) -> bool:
+        if 0 <= volume <= 100:
+            self.volume = volume
+            self._send("set_volume", volume)
+            return True
+        return False
+
+    def volume_up(self, step: int = 10) -> bool:
+        return self.set_volume(min(100, self.volume + step))
+
+    def volume_down(self, step: int = 10) -> bool:
+        return self.set_volume(max(0, self.volume - step))
+
+    def get_current_track(self) -> str:
+        return self._call("get_current_track", default="")
+
+    def get_readable_current_track(self) -> str:
+        return self._call("get_readable_current_track", default="")
+
+    def wakeup_light(self):
+        self._send("wakeup_light")
+
+    def speak_light(self):
+        self._send("speak_light")
+
+    def think_light(self):
+        self._send("think_light")
+
+    def stop_light(self):
+        self._send("stop_light")
+
+class CommandTask:
+    """Выполнение долгой команды в отдельном потоке с возможностью прервать её.
+
+    Новая команда плагина прерывает выполняющуюся. Команда получает
+    последним аргументом cancel (threading.Event) и проверяет его между шагами.
+    """
+
+    def __init__(self, join_timeout: float = 2.0):
+        self.join_timeout = join_timeout
+        self._lock = threading.Lock()
+        self._cancel = None
+        self._thread = None
+
+    def run(self, func, *args):
+        """Прерывает текущую команду и запускает func(*args, cancel) в фоне"""
+        with self._lock:
+            self._cancel_current()
+            cancel = threading.Event()
+            self._cancel = cancel
+            self._thread = threading.Thread(target=self._run, args=(func, args, cancel), daemon=True)
+            self._thread.start()
+
+    def cancel(self):
+        """Прерывает текущую команду"""
+        with self._lock:
+            self._cancel_current()
+
+    def _run(self, func, args, cancel):
+        try:
+            func(*args, cancel)
+        except Exception as e:
+            print(f"Ошибка выполнения команды: {e}")
+
+    def _cancel_current(self):
+        if self._cancel is not None:
+            self._cancel.set()
+        thread = self._thread
+        if self.join_timeout and thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(self.join_timeout)
+
+# Прерванную команду не ждем, чтобы не блокировать поток команд: вызов VLC
+# прервать нельзя, а порядок play()/stop() обеспечивает сам плеер
+music_task = CommandTask(join_timeout=0)
+music_player_lock = threading.Lock()
+
 # функция на старте
 def start(core: VACore):
     manifest = {
         "name": "Музыкальный плеер VLC",
-        "version": "1.4",
+        "version": "1.8",
         "require_online": False,
         "description": "Управление локальной музыкой через VLC player. "
                        "Воспроизведение, пауза, переключение треков, регулировка громкости, перемешивание.",
         "options_label": {
             "music_folder": "Папка с музыкой (относительно папки программы, например: ../Music)",
             "default_volume": "Громкость по умолчанию (0-100)",
-            "is_need_light" : "Нужно ли мигание лампочек (при использовании respeaker в качестве микрофона)"
+            "is_need_light" : "Нужно ли мигание лампочек (при использовании respeaker в качестве микрофона)",
+            "use_worker_process": "Запускать плеер в отдельном процессе, чтобы зависание VLC не блокировало ассистента",
+            "worker_timeout": "Сколько секунд команда ждет ответа от процесса плеера",
+            "worker_startup_timeout": "Через сколько секунд без ответа при запуске процесс плеера перезапускается",
+            "worker_hang_timeout": "Через сколько секунд без ответа процесс плеера считается зависшим и перезапускается",
+            "normalize_loudness": "Выравнивать громкость треков (нужны numpy и ffmpeg, анализ идет в фоне)",
+            "target_loudness": "Целевая громкость треков в LUFS",
+            "analysis_workers": "Сколько процессов использовать для анализа громкости"
         },
 
         "default_options": {
             "music_folder": "../Music",
             "default_volume": "50",
-            "is_need_light" : False
+            "is_need_light" : False,
+            "use_worker_process": False,
+            "worker_timeout": "5",
+            "worker_startup_timeout": "30",
+            "worker_hang_timeout": "30",
+            "normalize_loudness": False,
+            "target_loudness": "-18",
+            "analysis_workers": "2"
         },
 
         "commands": {
@@ -274,9 +1035,27 @@ def init_music_player(core: VACore):
     """Инициализация музыкального плеера"""
     options = core.plugin_options(modname)
     
-    if not hasattr(core, 'music_player'):
+    with music_player_lock:
+        if hasattr(core, 'music_player'):
+            return
         music_folder = options["music_folder"]
-        core.music_player = MusicPlayer(music_folder)
+        player_options = {"normalize_loudness": options.get("normalize_loudness", False)}
+        try:
+            player_options["target_loudness"] = float(options.get("target_loudness", -18))
+            player_options["analysis_workers"] = int(options.get("analysis_workers", 2))
+        except ValueError:
+            pass
+        if options.get("use_worker_process", False):
+            try:
+                timeout = float(options.get("worker_timeout", 5))
+                startup_timeout = float(options.get("worker_startup_timeout", 30))
+                hang_timeout = float(options.get("worker_hang_timeout", 30))
+            except ValueError:
+                timeout, startup_timeout, hang_timeout = 5.0, 30.0, 30.0
+            core.music_player = MusicPlayerProxy(music_folder, timeout, startup_timeout, hang_timeout,
+                                                 player_options=player_options)
+        else:
+            core.music_player = MusicPlayer(music_folder, **player_options)
         
         # Устанавливаем громкость по умолчанию
         try:
@@ -287,11 +1066,19 @@ def init_music_player(core: VACore):
         
 def start_music(core: VACore, phrase: str):
     """Запуск музыки"""
+    music_task.run(play_music, core)
+
+def play_music(core: VACore, cancel: threading.Event):
+    """Инициализирует плеер и включает музыку (выполняется в music_task)"""
     init_music_player(core)
+    if cancel.is_set():
+        return
     
-    success = core.music_player.play()
+    success = core.music_player.play(cancel=cancel)
     if core.plugin_options(modname)["is_need_light"]:
         core.music_player.wakeup_light()
+    if cancel.is_set():
+        return
     if success:
         track_name = core.music_player.get_readable_current_track()
         core.play_voice_assistant_speech(f"Включаю {track_name}")
@@ -300,6 +1087,7 @@ def start_music(core: VACore, phrase: str):
 
 def pause_music(core: VACore, phrase: str):
     """Пауза/возобновление музыки"""
+    music_task.cancel()
     if not hasattr(core, 'music_player'):
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
@@ -313,6 +1101,7 @@ def pause_music(core: VACore, phrase: str):
 
 def stop_music(core: VACore, phrase: str):
     """Остановка музыки"""
+    music_task.cancel()
     if not hasattr(core, 'music_player'):
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
@@ -325,6 +1114,7 @@ def stop_music(core: VACore, phrase: str):
 
 def next_track(core: VACore, phrase: str):
     """Следующий трек"""
+    music_task.cancel()
     if not hasattr(core, 'music_player'):
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
@@ -337,6 +1127,7 @@ def next_track(core: VACore, phrase: str):
 
 def previous_track(core: VACore, phrase: str):
     """Предыдущий трек"""
+    music_task.cancel()
     if not hasattr(core, 'music_player'):
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
@@ -349,6 +1140,7 @@ def previous_track(core: VACore, phrase: str):
 
 def volume_up(core: VACore, phrase: str):
     """Увеличение громкости"""
+    music_task.cancel()
     if not hasattr(core, 'music_player'):
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
@@ -361,6 +1153,7 @@ def volume_up(core: VACore, phrase: str):
 
 def volume_down(core: VACore, phrase: str):
     """Уменьшение громкости"""
+    music_task.cancel()
     if not hasattr(core, 'music_player'):
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
@@ -373,6 +1166,7 @@ def volume_down(core: VACore, phrase: str):
 
 def music_status(core: VACore, phrase: str):
     """Статус воспроизведения"""
+    music_task.cancel()
     if not hasattr(core, 'music_player'):
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
@@ -390,23 +1184,41 @@ def music_status(core: VACore, phrase: str):
 def shuffle_music(core: VACore, phrase: str):
     """Перемешивание плейлиста"""
     if not hasattr(core, 'music_player'):
+        music_task.cancel()
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
     
+    music_task.run(play_shuffled, core)
+
+def play_shuffled(core: VACore, cancel: threading.Event):
+    """Перемешивает плейлист и включает первый трек (выполняется в music_task)"""
     core.music_player.shuffle_playlist()
     if core.plugin_options(modname)["is_need_light"]:
         core.music_player.think_light()
+    if cancel.is_set():
+        return
     core.play_voice_assistant_speech("Плейлист перемешан. Включаю первый трек.")
-    core.music_player.play(0)  # Запускаем первый трек в перемешанном плейлисте
+    if cancel.is_set():
+        return
+    core.music_player.play(0, cancel)  # Запускаем первый трек в перемешанном плейлисте
 
 def unshuffle_music(core: VACore, phrase: str):
     """Возврат к обычному порядку"""
     if not hasattr(core, 'music_player'):
+        music_task.cancel()
         core.play_voice_assistant_speech("Музыкальный плеер не инициализирован")
         return
     
+    music_task.run(play_unshuffled, core)
+
+def play_unshuffled(core: VACore, cancel: threading.Event):
+    """Восстанавливает порядок плейлиста и включает первый трек (выполняется в music_task)"""
     core.music_player.unshuffle_playlist()
     if core.plugin_options(modname)["is_need_light"]:
         core.music_player.think_light()
+    if cancel.is_set():
+        return
     core.play_voice_assistant_speech("Порядок плейлиста восстановлен")
-    core.music_player.play(0)
\ No newline at end of file
+    if cancel.is_set():
+        return
+    core.music_player.play(0, cancel)
\ No newline at end of file
@@ -3,29 +3,45 @@
 # Необходимо установить pip install newsapi-python
 
 import os
+import time
+import threading
 from datetime import datetime, timedelta
 from vacore import VACore
 
 modname = os.path.basename(__file__)[:-3] # calculating modname
 
+NEWS_PER_BATCH = 3  # сколько новостей читать за один раз
+
+news_feed = None  # последняя запрошенная лента, для продолжения по команде «ещё»
+scheduler = None  # общий планировщик запросов к NewsAPI
+scheduler_lock = threading.Lock()
+
 # функция на старте
 def start(core: VACore):
     manifest = {
         "name": "Новости NewsAPI",
-        "version": "1.1",
+        "version": "1.4",
         "require_online": True,
         "description": "Получение новостей через NewsAPI. Главные новости России, мира, новости из RBC, Lenta.ru",
 
         "options_label": {
             "api_key": "API ключ NewsAPI (получить на newsapi.org)",
             "page_size": "Количество новостей для получения (1-10)",
-            "language": "Язык новостей (ru, en)"
+            "language": "Язык новостей (ru, en)",
+            "daily_quota": "Сколько запросов к NewsAPI можно сделать за сутки (у бесплатного ключа 100)",
+            "quota_reserve": "Сколько запросов из суточного лимита оставлять только для голосовых команд",
+            "cache_ttl": "Сколько секунд использовать уже полученные новости без нового запроса"
         },
 
         "default_options": {
             "api_key": "",
             "page_size": "5",
-            "language": "ru"
+            "language": "ru",
+            "daily_quota": "100",
+            "quota_reserve": "10",
+            "cache_ttl": "300",
+            "quota_day": "",
+            "quota_used": 0
         },
 
         "commands": {
@@ -36,6 +52,8 @@ def start(core: VACore):
             "новости лента|лента|новости из ленты": get_lenta_news,
             "технические новости|новости технологий": get_tech_news,
             "спортивные новости|новости спорта": get_sports_news,
+            "ещё новости|еще новости|дальше новости|продолжи новости": more_news,
+            "хватит новостей|стоп новости|останови новости": stop_news,
         }
     }
     return manifest
@@ -43,6 +61,56 @@ def start(core: VACore):
 def start_with_options(core: VACore, manifest: dict):
     pass
 
+class CommandTask:
+    """Выполнение долгой команды в отдельном потоке с возможностью прервать её.
+
+    Новая команда плагина прерывает выполняющуюся. Команда получает
+    последним аргументом cancel (threading.Event), проверяет его между
+    шагами и ждет через cancel.wait() вместо time.sleep().
+    """
+
+    def __init__(self, join_timeout: float = 2.0):
+        self.join_timeout = join_timeout
+        self._lock = threading.Lock()
+        self._cancel = None
+        self._thread = None
+
+    def run(self, func, *args):
+        """Прерывает текущую команду и запускает func(*args, cancel) в фоне"""
+        with self._lock:
+            self._cancel_current()
+            cancel = threading.Event()
+            self._cancel = cancel
+            self._thread = threading.Thread(target=self._run, args=(func, args, cancel), daemon=True)
+            self._thread.start()
+
+    def cancel(self):
+        """Прерывает текущую команду"""
+        with self._lock:
+            self._cancel_current()
+
+    def is_running(self) -> bool:
+        """Выполняется ли сейчас команда"""
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def _run(self, func, args, cancel):
+        try:
+            func(*args, cancel)
+        except Exception as e:
+            print(f"Ошибка выполнения команды: {e}")
+
+    def _cancel_current(self):
+        if self._cancel is not None:
+            self._cancel.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            # Ждем недолго: сетевой запрос прервать нельзя, он завершится сам
+            thread.join(self.join_timeout)
+
+news_task = CommandTask()
+speech_lock = threading.RLock()  # речь задач news_task не перекрывается
+
 def get_newsapi_client(api_key: str):
     """Создает и возвращает клиент NewsAPI"""
     try:
@@ -51,89 +119,393 @@ def get_newsapi_client(api_key: str):
     except ImportError:
         raise ImportError("Библиотека newsapi-python не установлена. Установите: pip install newsapi-python")
 
+PRIORITY_INTERACTIVE = 0  # запрос по голосовой команде, пользователь ждет ответа
+PRIORITY_BACKGROUND = 1   # фоновая подгрузка, может подождать или обойтись кешем
+
+class NewsQuotaExceeded(Exception):
+    """Суточный лимит запросов к NewsAPI исчерпан, а подходящего кеша нет"""
+
+class NewsApiScheduler:
+    """Учет суточного лимита запросов к NewsAPI.
+
+    Одинаковые одновременные запросы объединяются в один, свежие ответы
+    берутся из кеша. Когда лимит почти исчерпан, фоновые запросы получают
+    только кеш, а последние запросы остаются для голосовых команд.
+    """
+
+    def __init__(self, daily_quota: int = 100, reserve: int = 10, cache_ttl: float = 300,
+                 day: str = "", used: int = 0, on_spend=None):
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        self.cache_ttl = cache_ttl
+        self.day = day
+        self.used = used
+        self.on_spend = on_spend  # on_spend(day, used) - для сохранения счетчика
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._cache: dict = {}     # ключ -> (время получения, ответ)
+        self._in_flight: dict = {} # ключ -> [Event, ответ, ошибка]
+
+    def _roll_day(self):
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self.day != today:
+            self.day = today
+            self.used = 0
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._roll_day()
+            return max(self.daily_quota - self.used, 0)
+
+    def request(self, newsapi, method: str, params: dict, priority: int = PRIORITY_INTERACTIVE) -> dict:
+        """Выполняет newsapi.<method>(**params) с учетом лимита и кеша"""
+        key = (method, tuple(sorted(params.items())))
+
+        with self._lock:
+            self._roll_day()
+            waiter = self._in_flight.get(key)
+            if waiter is None:
+                cached = self._cache.get(key)
+                if cached and time.monotonic() - cached[0] < self.cache_ttl:
+                    return cached[1]
+
+                limit = 0 if priority == PRIORITY_INTERACTIVE else self.reserve
+                if self.daily_quota - self.used <= limit:
+                    if cached:
+                        print("Лимит NewsAPI почти исчерпан, отдаю новости из кеша")
+                        return cached[1]
+                    raise NewsQuotaExceeded(f"использовано {self.used} из {self.daily_quota} запросов")
+
+                self.used += 1
+                waiter = [threading.Event(), None, None]
+                self._in_flight[key] = waiter
+                is_owner = True
+            else:
+                is_owner = False
+
+        if not is_owner:
+            waiter[0].wait()
+            if waiter[2] is not None:
+                raise waiter[2]
+            return waiter[1]
+
+        self._save_counter()
+
+        try:
+            response = getattr(newsapi, method)(**params)
+            waiter[1] = response
+            with self._lock:
+                self._cache[key] = (time.monotonic(), response)
+            return response
+        except Exception as e:
+            waiter[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            waiter[0].set()
+
+    def _save_counter(self):
+        """Сохраняет текущий счетчик запросов"""
+        if not self.on_spend:
+            return
+        # Сохранения идут по одному и всегда с актуальным значением,
+        # чтобы меньший счетчик не перезаписал больший
+        with self._save_lock:
+            with self._lock:
+                day, used = self.day, self.used
+            try:
+                self.on_spend(day, used)
+            except Exception as e:
+                print(f"Не удалось сохранить счетчик запросов NewsAPI: {e}")
+
+def get_scheduler(core: VACore) -> NewsApiScheduler:
+    """Возвращает общий планировщик запросов, создавая его при первом обращении"""
+    global scheduler
+    with scheduler_lock:
+        if scheduler is None:
+            options = core.plugin_options(modname)
+
+            def save_quota(day: str, used: int):
+                options = core.plugin_options(modname)
+                options["quota_day"] = day
+                options["quota_used"] = used
+                core.save_plugin_options(modname, options)
+
+            scheduler = NewsApiScheduler(
+                daily_quota=int(options.get("daily_quota", 100)),
+                reserve=int(options.get("quota_reserve", 10)),
+                cache_ttl=float(options.get("cache_ttl", 300)),
+                day=options.get("quota_day", ""),
+                used=int(options.get("quota_used", 0)),
+                on_spend=save_quota
+            )
+    return scheduler
+
+def fetch_articles(scheduler: NewsApiScheduler, newsapi, language: str, page_size: int, page: int = 1,
+                   sources: str = None, category: str = None, country: str = None,
+                   priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """Запрашивает одну страницу новостей в NewsAPI через планировщик"""
+    if sources:
+        # Новости из конкретных источников
+        method = 'get_top_headlines'
+        params = dict(sources=sources)
+    elif category:
+        # Новости по категории
+        method = 'get_top_headlines'
+        params = dict(category=category)
+    elif country:
+        # Новости по стране
+        method = 'get_top_headlines'
+        params = dict(country=country)
+    else:
+        # Общие новости
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        method = 'get_everything'
+        params = dict(sort_by='publishedAt', from_param=yesterday)
+
+    params.update(language=language, page_size=page_size, page=page)
+    return scheduler.request(newsapi, method, params, priority)
+
+class NewsFeed:
+    """Загруженные новости одного запроса для продолжения по команде «ещё».
+
+    Пока озвучивается текущая порция, следующая страница подгружается в фоне.
+    """
+
+    def __init__(self, news_type: str, fetch, page_size: int):
+        self.news_type = news_type
+        self.fetch = fetch  # fetch(page, priority) -> ответ NewsAPI
+        self.page_size = page_size
+        self.articles: list = []
+        self.position: int = 0
+        self.page: int = 0
+        self.total_results = None
+        self.is_exhausted: bool = False
+        self._lock = threading.Lock()
+        self._position_lock = threading.Lock()
+        self._prefetch_thread = None
+
+    def load_page(self, priority: int = PRIORITY_INTERACTIVE):
+        """Загружает следующую страницу и добавляет её статьи"""
+        with self._lock:
+            if self.is_exhausted:
+                return
+            response = self.fetch(self.page + 1, priority)
+            articles = response.get('articles', [])
+            self.page += 1
+            self.articles.extend(articles)
+            self.total_results = response.get('totalResults', self.total_results)
+            if not articles or len(articles) < self.page_size or \
+                    (self.total_results is not None and self.page * self.page_size >= self.total_results):
+                self.is_exhausted = True
+
+    def _prefetch(self):
+        try:
+            self.load_page(PRIORITY_BACKGROUND)
+        except Exception as e:
+            # Не страшно: take_next попробует загрузить страницу сам
+            print(f"Ошибка фоновой загрузки новостей: {e}")
+
+    def prefetch(self):
+        """Запускает фоновую загрузку следующей страницы"""
+        if self.is_exhausted:
+            return
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+        self._prefetch_thread = threading.Thread(target=self._prefetch, daemon=True)
+        self._prefetch_thread.start()
+
+    def has_more(self) -> bool:
+        return self.position < len(self.articles) or not self.is_exhausted
+
+    def take_next(self, cancel: threading.Event):
+        """Возвращает номер и следующую непрочитанную новость, сдвигая позицию.
+
+        Прерванная задача (cancel установлен) позицию не меняет и получает None.
+        """
+        if self.position >= len(self.articles):
+            if self._prefetch_thread is not None:
+                self._prefetch_thread.join()
+            if self.position >= len(self.articles):
+                self.load_page()
+
+        with self._position_lock:
+            if cancel.is_set() or self.position >= len(self.articles):
+                return None
+            index = self.position
+            self.position += 1
+
+        if len(self.articles) - self.position < NEWS_PER_BATCH:
+            self.prefetch()
+        return index, self.articles[index]
+
+def speak(core: VACore, text: str, cancel: threading.Event) -> bool:
+    """Озвучивает text, если задача не прервана.
+
+    Речь идет под speech_lock, поэтому новая задача не начнет говорить,
+    пока прерванная не договорит текущую фразу.
+    """
+    with speech_lock:
+        if cancel.is_set():
+            return False
+        core.play_voice_assistant_speech(text)
+        return True
+
 def get_news(core: VACore, news_type: str, sources: str = None, category: str = None, country: str = None):
     """Базовая функция получения новостей"""
     options = core.plugin_options(modname)
-    api_key = options["api_key"]
     
-    if not api_key:
+    if not options["api_key"]:
+        news_task.cancel()
         core.play_voice_assistant_speech("Нужен API ключ для NewsAPI. Получите его на newsapi.org и укажите в настройках плагина.")
         return
     
+    # Новости читаются в фоне, чтобы их можно было прервать
+    news_task.run(load_news, core, news_type, sources, category, country)
+
+def load_news(core: VACore, news_type: str, sources: str, category: str, country: str, cancel: threading.Event):
+    """Загружает и озвучивает новости (выполняется в news_task)"""
+    global news_feed
+    options = core.plugin_options(modname)
+    api_key = options["api_key"]
+    if cancel.is_set():
+        return
+    # «ещё» не должно продолжать прошлую тему, если новый запрос не удастся
+    news_feed = None
+    
     try:
         newsapi = get_newsapi_client(api_key)
+        news_scheduler = get_scheduler(core)
         
         page_size = int(options.get("page_size", 5))
         page_size = min(max(page_size, 1), 10)
+        language = options.get("language", "ru")
+
+        feed = NewsFeed(
+            news_type,
+            lambda page, priority: fetch_articles(news_scheduler, newsapi, language, page_size, page,
+                                                   sources=sources, category=category, country=country,
+                                                   priority=priority),
+            page_size
+        )
+        feed.load_page()
         
-        # Получаем новости в зависимости от типа запроса
-        if sources:
-            # Новости из конкретных источников
-            all_articles = newsapi.get_top_headlines(
-                sources=sources,
-                language=options.get("language", "ru"),
-                page_size=page_size
-            )
-        elif category:
-            # Новости по категории
-            all_articles = newsapi.get_top_headlines(
-                category=category,
-                language=options.get("language", "ru"),
-                page_size=page_size
-            )
-        elif country:
-            # Новости по стране
-            all_articles = newsapi.get_top_headlines(
-                country=country,
-                language=options.get("language", "ru"),
-                page_size=page_size
-            )
-        else:
-            # Общие новости
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            all_articles = newsapi.get_everything(
-                language=options.get("language", "ru"),
-                sort_by='publishedAt',
-                page_size=page_size,
-                from_param=yesterday
-            )
-        
-        articles = all_articles.get('articles', [])
-        
-        if not articles:
-            core.play_voice_assistant_speech(f"{news_type} не найдены. Попробуйте позже.")
+        if cancel.is_set():
+            return
+        if not feed.articles:
+            speak(core, f"{news_type} не найдены. Попробуйте позже.", cancel)
+            core.context_clear()
             return
         
-        # Озвучиваем новости
-        core.play_voice_assistant_speech(f"Вот {news_type.lower()}:")
+        # Озвучиваем новости; в контексте их можно прервать или продолжить
+        news_feed = feed
+        core.context_set(NewsContext)
+        speak(core, f"Вот {news_type.lower()}:", cancel)
+        read_news(core, feed, cancel)
         
-        for i, article in enumerate(articles[:3]):  # Ограничиваем 3 новостями
+    except NewsQuotaExceeded as e:
+        print(f"Лимит NewsAPI: {e}")
+        if cancel.is_set():
+            return  # контекстом уже управляет более новая команда
+        news_feed = None
+        speak(core, "Лимит запросов к NewsAPI на сегодня исчерпан. Попробуйте завтра.", cancel)
+        core.context_clear()
+
+    except ImportError:
+        if cancel.is_set():
+            return
+        news_feed = None
+        speak(core, "Для работы новостей нужно установить библиотеку newsapi-python. Установите: pip install newsapi-python", cancel)
+        core.context_clear()
+    
+    except Exception as e:
+        print(f"Ошибка получения новостей: {e}")
+        if cancel.is_set():
+            return
+        news_feed = None
+        speak(core, "Не удалось получить новости. Проверьте подключение к интернету и настройки API.", cancel)
+        core.context_clear()
+
+def read_news(core: VACore, feed: NewsFeed, cancel: threading.Event):
+    """Озвучивает очередную порцию новостей из ленты"""
+    for _ in range(NEWS_PER_BATCH):
+        # Новость берется и озвучивается под speech_lock: позиция сдвигается
+        # только для прочитанных новостей, а непрочитанные останутся для «ещё»
+        with speech_lock:
+            item = feed.take_next(cancel)
+            if item is None:
+                break
+            i, article = item
             title = article.get('title', '')
-            source = article.get('source', {}).get('name', '')
+            source = (article.get('source') or {}).get('name', '')
             
             if title:
                 # Очищаем заголовок для озвучивания
                 clean_title = clean_news_title(title, source)
                 
                 news_text = f"Новость {i+1}"
-                if source and len(articles) > 1:
+                if source and len(feed.articles) > 1:
                     news_text += f" из {source}"
                 news_text += f": {clean_title}"
                 
                 core.play_voice_assistant_speech(news_text)
-                
-                # Небольшая пауза между новостями
-                import time
-                time.sleep(1)
         
-        core.play_voice_assistant_speech("Вот и все новости.")
-        
-    except ImportError:
-        core.play_voice_assistant_speech("Для работы новостей нужно установить библиотеку newsapi-python. Установите: pip install newsapi-python")
+        # Небольшая пауза между новостями
+        if title and cancel.wait(1):
+            return
     
+    with speech_lock:
+        if cancel.is_set():
+            return
+        if feed.has_more():
+            core.play_voice_assistant_speech("Скажите «ещё», чтобы продолжить.")
+            # ----------- set context ------
+            core.context_set(NewsContext)
+        else:
+            core.play_voice_assistant_speech("Вот и все новости.")
+            core.context_clear()
+
+def more_news(core: VACore, phrase: str):
+    """Продолжение последних запрошенных новостей"""
+    news_task.run(read_more_news, core)
+
+def read_more_news(core: VACore, cancel: threading.Event):
+    """Озвучивает следующую порцию новостей (выполняется в news_task)"""
+    if news_feed is None or not news_feed.has_more():
+        speak(core, "Больше новостей нет. Спросите новости заново.", cancel)
+        core.context_clear()
+        return
+
+    try:
+        core.context_set(NewsContext)
+        read_news(core, news_feed, cancel)
+    except NewsQuotaExceeded as e:
+        print(f"Лимит NewsAPI: {e}")
+        speak(core, "Лимит запросов к NewsAPI на сегодня исчерпан. Попробуйте завтра.", cancel)
+        core.context_clear()
     except Exception as e:
         print(f"Ошибка получения новостей: {e}")
-        core.play_voice_assistant_speech("Не удалось получить новости. Проверьте подключение к интернету и настройки API.")
+        speak(core, "Не удалось получить новости. Проверьте подключение к интернету и настройки API.", cancel)
+        core.context_clear()
+
+def stop_news(core: VACore, phrase: str):
+    """Прерывает чтение новостей"""
+    news_task.cancel()
+    core.context_clear()
+
+def NewsContext(core: VACore, phrase: str):
+    """Контекст во время и после чтения новостей"""
+    if phrase in ("ещё", "еще", "дальше", "продолжай", "давай"):
+        more_news(core, phrase)
+    elif phrase in ("хватит", "нет", "стоп", "всё", "все", "достаточно"):
+        stop_news(core, phrase)
+    elif news_task.is_running():
+        # Новости еще читаются - не перебиваем их переспросом
+        core.context_set(NewsContext)
+    else:
+        core.play_voice_assistant_speech("не разобрала. Продолжить новости?")
+        core.context_set(NewsContext)
 
 def clean_news_title(title: str, source: str) -> str:
     """Очищает заголовок новости для лучшего озвучивания"""